@@ -1,17 +1,96 @@
 import datetime
-import re
+import functools
+import queue
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from nio import GeneratorBlock, Signal
 from nio.command import command
 from nio.modules.scheduler import Job
 from nio.properties import ListProperty, IntProperty, FloatProperty, \
     PropertyHolder, StringProperty, VersionProperty
-from nio.util.threading import spawn
 
 import serial
 
 
+def _expected_duration(nbytes):
+    # worst case wire time for a reply of nbytes at 1200 baud 7E1 (10
+    # bits per byte on the wire), plus turnaround slack; used to size
+    # read timeouts so a silent probe fails fast instead of burning the
+    # blanket 1 second per read
+    return nbytes * 10 / 1200 + 0.1
+
+
+# powers of ten for scaling fractional digits, precomputed so the fast
+# parser never calls pow() in the hot path
+_POW10 = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+try:
+    # optional accelerated decimal parser; purely additive, the pure
+    # Python path below covers the common case when it isn't installed
+    from fastnumbers import try_float as _try_float
+except ImportError:
+    _try_float = None
+
+
+def _fast_parse_signed_decimal(buf):
+    # parse a b'+ddd.dd' style token with integer arithmetic instead of
+    # routing through CPython's general-purpose float() parser; tokens
+    # come from _parse_sdi12_values so the shape is already known-good
+    if _try_float is not None:
+        value = _try_float(bytes(buf), on_fail=None)
+        if value is not None:
+            return value
+    try:
+        mantissa = 0
+        frac_len = 0
+        in_fraction = False
+        for char in buf[1:]:
+            if char == 46:  # b'.'
+                in_fraction = True
+                continue
+            mantissa = mantissa * 10 + (char - 48)
+            if in_fraction:
+                frac_len += 1
+        value = mantissa / _POW10[frac_len]
+        return -value if buf[0] == 45 else value  # b'-'
+    except IndexError:
+        # more fractional digits than the table covers
+        return float(bytes(buf))
+
+
+def _parse_sdi12_values(buf):
+    # scan a raw SDI-12 data response for signed decimal values, e.g.
+    # b'+12.345-6.789' -> [12.345, -6.789]; the frame grammar is fixed
+    # (sign, digits, dot, digits) so a single pass over the bytes beats
+    # spinning up the regex engine for every reply
+    values = list()
+    i = 0
+    end = len(buf)
+    while i < end:
+        if buf[i] != 43 and buf[i] != 45:  # b'+' and b'-'
+            i += 1
+            continue
+        start = i
+        i += 1
+        int_digits = 0
+        while i < end and 48 <= buf[i] <= 57:  # b'0' through b'9'
+            i += 1
+            int_digits += 1
+        if not int_digits or i >= end or buf[i] != 46:  # b'.'
+            continue
+        i += 1
+        frac_digits = 0
+        while i < end and 48 <= buf[i] <= 57:
+            i += 1
+            frac_digits += 1
+        if not frac_digits:
+            continue
+        values.append(_fast_parse_signed_decimal(buf[start:i]))
+    return values
+
+
 class ConfiguredProbe(PropertyHolder):
 
     name = StringProperty(title='Name', default='Zone X', order=0)
@@ -31,6 +110,13 @@ class Aquacheck(GeneratorBlock):
         'timeout': 1,
     }
 
+    # the SDI-12 command set is tiny and fixed; pre-encode it once so the
+    # read loops never format or encode command strings
+    _I_CMD = b'0I!\r\n'
+    _M0_CMD = b'0M0!\r\n'
+    _M1_CMD = b'0M1!\r\n'
+    _D_CMDS = tuple('0D{}!\r\n'.format(r).encode() for r in range(10))
+
     configured_probes = ListProperty(
         ConfiguredProbe,
         title='Soil Moisture Probes',
@@ -56,18 +142,38 @@ class Aquacheck(GeneratorBlock):
                                     # False: Port open, bad data
                                     # None: Port closed
         self._reader_jobs = list()  # scheduled jobs
-        self._readings = dict()  # internal buffer for readings
+        self._reading_q = queue.SimpleQueue()  # completed probe readings
+        self._pool = None  # shared worker pool, created in configure()
+        self._open_serial = None  # serial.Serial with COM_PARAMS bound
+        self._state_log = dict()  # state logging dispatch, see configure()
 
     def configure(self, context):
         super().configure(context)
-        connection_threads = list()
+        # state -> (log method, message template), bound once so state
+        # changes dispatch straight to the right logger call
+        self._state_log = {
+            True: (self.logger.info, '[{}] Status: Ready'),
+            False: (self.logger.warning, '[{}] Status: Protocol Error'),
+            None: (self.logger.warning, '[{}] Status: Interface Error'),
+        }
+        # bind the fixed interface parameters once instead of copying
+        # COM_PARAMS into fresh kwargs on every open; bound here rather
+        # than at class scope so the constructor is resolved at configure
+        # time
+        self._open_serial = functools.partial(serial.Serial, **self.COM_PARAMS)
+        # one worker per probe, reused for every cycle instead of paying
+        # thread creation per read
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, len(self.configured_probes())))
+        connection_futures = list()
         for probe in self.configured_probes():
             self.port_names[probe.name()] = probe.port()
-            thread = spawn(self._open_port, probe.name(), probe.port())
-            connection_threads.append(thread)
-        for thread in connection_threads:
+            future = self._pool.submit(
+                self._open_port, probe.name(), probe.port())
+            connection_futures.append(future)
+        for future in connection_futures:
             try:
-                thread.join()
+                future.result()
             except Exception as e:
                 # log errors from worker threads
                 self.logger.warning('worker thread raised {}'.format(
@@ -105,17 +211,18 @@ class Aquacheck(GeneratorBlock):
         # cancel jobs
         for job in self._reader_jobs:
             job.cancel()
+        # let in-flight readers finish before closing ports
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
         # close ports
         for name, port in self.ports.items():
             port.close()
-            self.logger.debug('[{}] Closed port {}'.format(name, port.name))
+            self.logger.debug('[%s] Closed port %s', name, port.name)
         super().stop()
 
     def _open_port(self, name, port_name):
-        params = self.COM_PARAMS.copy()
-        params['port'] = port_name
         try:
-            port = serial.Serial(**params)
+            port = self._open_serial(port=port_name)
         except:
             if self._probe_states.get('name', False) is None:
                 # if already set to None, interface error is already logged
@@ -125,15 +232,25 @@ class Aquacheck(GeneratorBlock):
                 port_name))
             self._set_probe_state(name, None)
             return
+        try:
+            # USB serial adapters batch small replies for up to ~16ms per
+            # read unless the kernel's ASYNC_LOW_LATENCY flag is set, which
+            # adds up over the many short SDI-12 round-trips; best effort,
+            # not every port type supports it
+            port.set_low_latency_mode(True)
+        except (AttributeError, NotImplementedError, ValueError) as e:
+            self.logger.debug(
+                '[%s] Low-latency mode not available: %s', name, e)
         # get probe info
-        command = '0I!\r\n'.encode()
+        command = self._I_CMD
         port.write(command)
-        self.logger.debug('[{}] --> {}'.format(name, command))
-        response = port.readline()
-        self.logger.debug('[{}] <-- {}'.format(name, response))
-        response = response.decode().rstrip()
+        self.logger.debug('[%s] --> %s', name, command)
+        port.timeout = _expected_duration(40)
+        response = port.read_until(b'\r\n', 80)
+        self.logger.debug('[%s] <-- %s', name, response)
+        response = response.rstrip()
         try:
-            probe_model_info = response.split('AquaChck')[-1]
+            probe_model_info = response.split(b'AquaChck')[-1]
         except:
             if response:
                 self.logger.error('[{}] Invalid response: \"{}\"'.format(
@@ -146,137 +263,135 @@ class Aquacheck(GeneratorBlock):
         probe_version = probe_model_info[6:9]
         probe_serial_number = probe_model_info[10:]
         self.logger.debug(
-            '[{}] Ready on {} (S/N {} v.{})'.format(
-                name,
-                port_name,
-                probe_serial_number,
-                probe_version))
+            '[%s] Ready on %s (S/N %s v.%s)',
+            name,
+            port_name,
+            probe_serial_number,
+            probe_version)
         self.ports[name] = port
         self._set_probe_state(name, True)
 
     def _read(self, name, port):
-        # moisture sensors
-        command = '0M0!\r\n'.encode()
-        port.write(command)
-        self.logger.debug('[{}] --> {}'.format(name, command))
-        response = port.readline()
-        self.logger.debug('[{}] <-- {}'.format(name, response))
-        response = response.decode().rstrip()
-        delay = int(response[0:3])
-        num_sensors = int(response[-1])
+        moisture_values, moisture_error = self._read_measurement(
+            name, port, self._M0_CMD, 'moisture')
+        if moisture_error and not moisture_values:
+            # a probe that produced nothing at all won't answer the
+            # temperature commands either; don't double the wasted time
+            temperature_values, temp_error = list(), True
+        else:
+            temperature_values, temp_error = self._read_measurement(
+                name, port, self._M1_CMD, 'temperature')
+        self._reading_q.put((name, {
+                'moisture_values': moisture_values,
+                'temperature_values': temperature_values,
+            }))
+        if moisture_error or temp_error:
+            self._set_probe_state(name, False)
+        else:
+            self._set_probe_state(name, True)
+
+    def _read_measurement(self, name, port, start_cmd, kind):
+        # run one measurement (start command, optional attention response,
+        # D-command drain) and return (values, error); moisture and
+        # temperature only differ by start command and label
+        port.write(start_cmd)
+        self.logger.debug('[%s] --> %s', name, start_cmd)
+        # M replies are only a few bytes
+        port.timeout = _expected_duration(16)
+        response = port.read_until(b'\r\n', 80)
+        self.logger.debug('[%s] <-- %s', name, response)
+        response = response.rstrip()
+        # the header fields must all be ASCII digits; line noise that
+        # survives the length check would otherwise turn into a bogus
+        # multi-hour delay or an out-of-range sensor count below
+        header_ok = (
+            len(response) >= 4
+            and 48 <= response[0] <= 57
+            and 48 <= response[1] <= 57
+            and 48 <= response[2] <= 57
+            and 48 <= response[-1] <= 57)
+        if not header_ok:
+            self.logger.error(
+                '[{}] Invalid response to {}: \"{}\"'.format(
+                    name,
+                    start_cmd,
+                    response))
+            return list(), True
+        # the header is fixed-width ASCII digits (dddn), so the fields
+        # fall out of byte arithmetic without slicing out intermediate
+        # bytes objects for int()
+        delay = \
+            (response[0] - 48) * 100 + (response[1] - 48) * 10 \
+            + response[2] - 48
+        num_sensors = response[-1] - 48
+        if num_sensors == 0:
+            # no data is coming; skip the attention wait and D loop so
+            # the failure doesn't cost a full round of timeouts
+            self.logger.warning(
+                '[{}] Probe reports 0 {} sensors'.format(name, kind))
+            return list(), True
         if delay:
             self.logger.debug(
-                '[{}] Sensors will be ready in {} seconds...'.format(
-                    name,
-                    delay))
-            time.sleep(delay)  # this should be a Job so it can be cancelled
-            attention_response = port.readline()
-            self.logger.debug('[{}] <-- {}'.format(name, attention_response))
+                '[%s] Sensors will be ready in %s seconds...',
+                name,
+                delay)
+            # widen the timeout for this one read so the kernel parks the
+            # thread until the attention response arrives, instead of
+            # sleeping the full worst-case delay
+            port.timeout = delay + 1
+            attention_response = port.read_until(b'\r\n', 80)
+            self.logger.debug('[%s] <-- %s', name, attention_response)
             if not attention_response:
                 self.logger.warning(
                     '[{}] No \"attention response\", continuing...'.format(
                         name))
         self.logger.debug(
-            '[{}] Reading {} moisture sensors'.format(name, num_sensors))
-        moisture_values = list()
-        moisture_error = False
+            '[%s] Reading %s %s sensors', name, num_sensors, kind)
+        values = list()
+        error = False
+        received = 0
+        chunks = list()
+        # D replies are bounded by the SDI-12 frame length
+        port.timeout = _expected_duration(80)
         for r in range(num_sensors):
-            command = '0D{}!\r\n'.format(r).encode()
+            command = self._D_CMDS[r]
             port.write(command)
-            self.logger.debug('[{}] --> {}'.format(name, command))
-            response = port.readline()
-            self.logger.debug('[{}] <-- {}'.format(name, response))
-            response = response.decode().rstrip()
+            self.logger.debug('[%s] --> %s', name, command)
+            response = port.read_until(b'\r\n', 80)
+            self.logger.debug('[%s] <-- %s', name, response)
+            # every value leads with its sign character, so counting
+            # signs tracks arrivals without parsing anything yet
+            received += response.count(b'+') + response.count(b'-')
+            # zero-copy trim of the CR/LF framing; join re-packs it
+            if response.endswith(b'\r\n'):
+                response = memoryview(response)[:-2]
             if not response:
                 break
-            values = re.findall('[\+\-][0-9]+\.[0-9]+', response)
-            for value in values:
-                try:
-                    moisture_value = float(value)
-                    assert -5 < moisture_value < 120
-                except ValueError:
-                    self.logger.error(
-                        '[{}] Invalid moisture value \"{}\"'.format(
-                            name,
-                            value))
-                    moisture_error = True
-                    continue
-                except AssertionError:
-                    self.logger.error(
-                        '[{}] Out of range moisture value \"{}\"'.format(
-                            name,
-                            moisture_value))
-                    moisture_error = True
-                    continue
-                moisture_values.append(moisture_value)
-        try:
-            assert len(moisture_values) == num_sensors
-        except AssertionError:
-            if not moisture_error:
-                self.logger.error(
-                    '[{}] Failed to read {} moisture sensors'.format(
-                        name,
-                        num_sensors - len(moisture_values)))
-                moisture_error = True
-        # temperature sensors
-        command = '0M1!\r\n'.encode()
-        port.write(command)
-        self.logger.debug('[{}] --> {}'.format(name, command))
-        response = port.readline()
-        self.logger.debug('[{}] <-- {}'.format(name, response))
-        response = response.decode().rstrip()
-        delay = int(response[0:3])  # should be 0, no attention response
-        num_sensors = int(response[-1])
-        self.logger.debug(
-            '[{}] Reading {} temperature sensors'.format(name, num_sensors))
-        temperature_values = list()
-        temp_error = False
-        for r in range(num_sensors):
-            command = '0D{}!\r\n'.format(r).encode()
-            port.write(command)
-            self.logger.debug('[{}] --> {}'.format(name, command))
-            response = port.readline()
-            self.logger.debug('[{}] <-- {}'.format(name, response))
-            response = response.decode().rstrip()
-            if not response:
+            chunks.append(response)
+            if received >= num_sensors:
+                # probes pack several values into each D reply; skip the
+                # remaining round-trips once everything has arrived
                 break
-            values = re.findall('[\+\-][0-9]+\.[0-9]+', response)
-            for value in values:
-                try:
-                    temperature_value = float(value)
-                    assert -5 < temperature_value < 120
-                except ValueError:
-                    self.logger.error(
-                        '[{}] Invalid temperature value \"{}\"'.format(
-                            name,
-                            value))
-                    temp_error = True
-                    continue
-                except AssertionError:
-                    self.logger.error(
-                        '[{}] Out of range temperature value \"{}\"'.format(
-                            name,
-                            temperature_value))
-                    temp_error = True
-                    continue
-                temperature_values.append(temperature_value)
-        try:
-            assert len(temperature_values) == num_sensors
-        except AssertionError:
-            if not temp_error:
+        # tokenize the whole drain in one pass; this is also agnostic to
+        # how the probe chooses to split values across D replies
+        for value in _parse_sdi12_values(b''.join(chunks)):
+            if not -5.0 < value < 120.0:
                 self.logger.error(
-                    '[{}] Failed to read {} temperature sensors'.format(
+                    '[{}] Out of range {} value \"{}\"'.format(
                         name,
-                        num_sensors - len(temperature_values)))
-                temp_error = True
-        self._readings[name] = {
-                'moisture_values': moisture_values,
-                'temperature_values': temperature_values,
-            }
-        if moisture_error or temp_error:
-            self._set_probe_state(name, False)
-        else:
-            self._set_probe_state(name, True)
+                        kind,
+                        value))
+                error = True
+                continue
+            values.append(value)
+        if len(values) != num_sensors and not error:
+            self.logger.error(
+                '[{}] Failed to read {} {} sensors'.format(
+                    name,
+                    num_sensors - len(values),
+                    kind))
+            error = True
+        return values, error
 
     def _set_probe_state(self, name, state):
         try:
@@ -287,19 +402,51 @@ class Aquacheck(GeneratorBlock):
             state_change = True
         if state_change:
             self._probe_states[name] = state
-            if state:
-                self.logger.info('[{}] Status: Ready'.format(name))
-            elif state is None:
-                self.logger.warning('[{}] Status: Interface Error'.format(name))
-            else:
-                self.logger.warning('[{}] Status: Protocol Error'.format(name))
+            log, template = self._state_log[state]
+            log(template.format(name))
 
     def _read_and_notify(self):
         self._active = True
-        self._readings = dict()  # clear internal buffer
-        self._spawn_readers()
+        # drop stale readings left over from a timed-out cycle
+        while True:
+            try:
+                self._reading_q.get_nowait()
+            except queue.Empty:
+                break
+        reader_futures = self._spawn_readers()
+        readings = dict()
+        # collect each probe's reading as it lands rather than joining
+        # every worker first, so one stalled probe can only cost its own
+        # reading; the read interval bounds the whole cycle
+        deadline = time.monotonic() + self.read_interval()
+        while len(readings) < len(reader_futures):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.warning('Timed out waiting for {} probes'.format(
+                    len(reader_futures) - len(readings)))
+                break
+            try:
+                name, reading = self._reading_q.get(
+                    timeout=min(remaining, 1))
+            except queue.Empty:
+                if all(future.done() for future in reader_futures):
+                    # a worker died without reporting a reading
+                    for future in reader_futures:
+                        e = future.exception()
+                        if e is not None:
+                            # log errors from worker threads
+                            self.logger.warning(
+                                'worker thread raised {}'.format(
+                                    e.__class__.__name__))
+                    break
+                continue
+            readings[name] = reading
         signal_list = list()
-        for name, reading in self._readings.items():
+        # emit in configured probe order; workers finish in arbitrary order
+        for name in self.port_names:
+            reading = readings.get(name)
+            if reading is None:
+                continue
             signal = Signal({
                 'name': name,
                 'moisture_values': reading['moisture_values'],
@@ -310,26 +457,25 @@ class Aquacheck(GeneratorBlock):
         self._active = False
 
     def _spawn_readers(self):
-        open_threads = list()
-        for name, state in self._probe_states.items():
+        # snapshot the shared maps up front; _open_port mutates them from
+        # worker threads while these loops run
+        probe_states = tuple(self._probe_states.items())
+        open_futures = list()
+        for name, state in probe_states:
             if state is None:
-                thread = spawn(self._open_port, name, self.port_names[name])
-                open_threads.append(thread)
-        for thread in open_threads:
-            try:
-                thread.join()
-            except Exception as e:
-                # log errors from worker threads
-                self.logger.warning('worker thread raised {}'.format(
-                    e.__class__.__name__))
-        reader_threads = list()
-        for name, port in self.ports.items():
-            thread = spawn(self._read, name, port)
-            reader_threads.append(thread)
-        for thread in reader_threads:
+                future = self._pool.submit(
+                    self._open_port, name, self.port_names[name])
+                open_futures.append(future)
+        for future in open_futures:
             try:
-                thread.join()
+                future.result()
             except Exception as e:
                 # log errors from worker threads
                 self.logger.warning('worker thread raised {}'.format(
                     e.__class__.__name__))
+        readers = tuple(self.ports.items())
+        reader_futures = list()
+        for name, port in readers:
+            future = self._pool.submit(self._read, name, port)
+            reader_futures.append(future)
+        return reader_futures
@@ -1,10 +1,80 @@
-import re
+import argparse
 import sys
-import time
+from time import monotonic as _monotonic, sleep
 
 import serial
 
 
+# powers of ten for scaling fractional digits, precomputed so the fast
+# parser never calls pow() in the hot path
+_POW10 = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+try:
+    # optional accelerated decimal parser; purely additive, the pure
+    # Python path below covers the common case when it isn't installed
+    from fastnumbers import try_float as _try_float
+except ImportError:
+    _try_float = None
+
+
+def _fast_parse_signed_decimal(buf):
+    # parse a b'+ddd.dd' style token with integer arithmetic instead of
+    # routing through CPython's general-purpose float() parser; tokens
+    # come from _parse_sdi12_values so the shape is already known-good
+    if _try_float is not None:
+        value = _try_float(bytes(buf), on_fail=None)
+        if value is not None:
+            return value
+    try:
+        mantissa = 0
+        frac_len = 0
+        in_fraction = False
+        for char in buf[1:]:
+            if char == 46:  # b'.'
+                in_fraction = True
+                continue
+            mantissa = mantissa * 10 + (char - 48)
+            if in_fraction:
+                frac_len += 1
+        value = mantissa / _POW10[frac_len]
+        return -value if buf[0] == 45 else value  # b'-'
+    except IndexError:
+        # more fractional digits than the table covers
+        return float(bytes(buf))
+
+
+def _parse_sdi12_values(buf):
+    # scan a raw SDI-12 data response for signed decimal values, e.g.
+    # b'+12.345-6.789' -> [12.345, -6.789]; the frame grammar is fixed
+    # (sign, digits, dot, digits) so a single pass over the bytes beats
+    # spinning up the regex engine for every reply
+    values = []
+    i = 0
+    end = len(buf)
+    while i < end:
+        if buf[i] != 43 and buf[i] != 45:  # b'+' and b'-'
+            i += 1
+            continue
+        start = i
+        i += 1
+        int_digits = 0
+        while i < end and 48 <= buf[i] <= 57:  # b'0' through b'9'
+            i += 1
+            int_digits += 1
+        if not int_digits or i >= end or buf[i] != 46:  # b'.'
+            continue
+        i += 1
+        frac_digits = 0
+        while i < end and 48 <= buf[i] <= 57:
+            i += 1
+            frac_digits += 1
+        if not frac_digits:
+            continue
+        values.append(_fast_parse_signed_decimal(buf[start:i]))
+    return values
+
+
 params = {
     'port': '/dev/ttyr00',
     'baudrate': 1200,
@@ -14,137 +84,186 @@ params = {
     'timeout': 1.0,
 }
 
+# pre-encoded SDI-12 command set; probe addresses 0-9 cover any probe
+_ID_CMD = b'0I!\r\n'
+_M0_CMD = b'0M0!\r\n'
+_M1_CMD = b'0M1!\r\n'
+_D_CMDS = tuple('0D{}!\r\n'.format(r).encode() for r in range(10))
+
+
 def elapsed(start_time):
-    return '{:.3f}'.format(time.monotonic() - start_time)
+    return f'{_monotonic() - start_time:.3f}'
 
 
-start_time = time.monotonic()
-print('opening port...')
-with serial.Serial(**params) as port:
-    print('finding probe...')
-    command = '0I!\r\n'.encode()
-    print('\t{} --> {}'.format(elapsed(start_time), command))
-    port.write(command)
-    response = port.readline()
-    print('\t{} <-- {}'.format(elapsed(start_time), response))
-    response = response.decode().rstrip()
-    try:
-        _, probe_model_info = response.split('AquaChck', 1)
-    except:
-        if response:
-            sys.exit('ERROR: Invalid response from probe: \"{}\"'.format(response))
-        sys.exit('ERROR: No response from probe')
-    probe_model = probe_model_info[:6]
-    probe_version = probe_model_info[6:9]
-    probe_serial_number = probe_model_info[9:]
-    print('Aquacheck {} S/N {} ver. {}'.format(
-        probe_model, probe_serial_number, probe_version))
+# buffered transaction log; one writelines+flush per phase instead of a
+# locked, flushed write() per traced command
+_log_buf = []
 
-    print('starting moisture measurement...')
-    command = '0M0!\r\n'.encode()
-    print('\t{} --> {}'.format(elapsed(start_time), command))
+
+def _log(line):
+    _log_buf.append(line + '\n')
+
+
+def _flush_log():
+    sys.stdout.writelines(_log_buf)
+    _log_buf.clear()
+    sys.stdout.flush()
+
+
+def _measure(port, command, start_time):
+    # run one measurement command (_M0_CMD moisture, _M1_CMD temperature)
+    # and drain its D replies; returns (values, error)
+    _log('\t{} --> {}'.format(elapsed(start_time), command))
     port.write(command)
-    response = port.readline()
-    print('\t{} <-- {}'.format(elapsed(start_time), response))
-    response = response.decode().rstrip()
-    delay = int(response[0:3])
-    num_sensors = int(response[-1])
-    # if there is a delay indicated, the probe will send \r\n as "attention response"
-    # after approx. <delay> seconds to signal that data is ready
+    response = port.read_until(b'\r\n', 80)
+    _log('\t{} <-- {}'.format(elapsed(start_time), response))
+    response = response.rstrip()
+    # the header fields must all be ASCII digits; line noise that
+    # survives the length check would otherwise turn into a bogus
+    # multi-hour delay or an out-of-range sensor count below
+    header_ok = (
+        len(response) >= 4
+        and 48 <= response[0] <= 57
+        and 48 <= response[1] <= 57
+        and 48 <= response[2] <= 57
+        and 48 <= response[-1] <= 57)
+    if not header_ok:
+        _log('ERROR: invalid response to {}: \"{}\"'.format(
+            command, response))
+        _flush_log()
+        return [], True
+    # the header is fixed-width ASCII digits (dddn), so the fields fall
+    # out of byte arithmetic without slicing out intermediate bytes
+    # objects for int()
+    delay = \
+        (response[0] - 48) * 100 + (response[1] - 48) * 10 \
+        + response[2] - 48
+    num_sensors = response[-1] - 48
+    if num_sensors == 0:
+        # no data is coming; skip the attention wait and D loop
+        _log('ERROR: probe reports 0 sensors')
+        _flush_log()
+        return [], True
+    # if there is a delay indicated, the probe will send \r\n as "attention
+    # response" after approx. <delay> seconds to signal that data is ready
     if delay:
-        attention_response = False
-        print('WAIT: {} sensors will be ready in {} seconds...'.format(
+        _log('WAIT: {} sensors will be ready in {} seconds...'.format(
             num_sensors, delay))
-        time.sleep(delay)
-        attention_response = port.readline()
-        print('\t{} <-- {}'.format(
-            elapsed(start_time), attention_response), flush=True)
+        _flush_log()  # show progress before the long attention wait
+        # widen the timeout for this one read so the call returns as soon
+        # as the attention response arrives, instead of sleeping the full
+        # worst-case delay
+        old_timeout = port.timeout
+        port.timeout = delay + 1
+        attention_response = port.read_until(b'\r\n', 80)
+        port.timeout = old_timeout
+        _log('\t{} <-- {}'.format(elapsed(start_time), attention_response))
         if not attention_response:
-            print('ERROR: no \"attention response\" from probe, continuing...')
-    print('reading moisture data...')
-    moisture_values = list()
+            _log('ERROR: no \"attention response\" from probe, continuing...')
+    _log('reading {} sensor values...'.format(num_sensors))
+    # preallocate and fill by index, the reported count is the final size
+    values = [0.0] * num_sensors
+    count = 0
     error = False
     for r in range(num_sensors):
-        command = '0D{}!\r\n'.format(r).encode()
-        print('\t{} --> {}'.format(
-            elapsed(start_time), command), flush=True)
+        command = _D_CMDS[r]
+        _log('\t{} --> {}'.format(elapsed(start_time), command))
         port.write(command)
-        response = port.readline()
-        print('\t{} <-- {}'.format(elapsed(start_time), response), flush=True)
-        response = response.decode().rstrip()
-        if not response:
+        response = port.read_until(b'\r\n', 80)
+        _log('\t{} <-- {}'.format(elapsed(start_time), response))
+        if not response.rstrip():
             break
-        values = re.findall('[\+\-][0-9]+\.[0-9]+', response)
-        for value in values:
-            if not value:
-                continue
-            try:
-                moisture_value = float(value)
-                assert -5 < moisture_value < 120
-            except ValueError:
-                if not value.isprintable():
-                    value = value.encode()
-                print('ERROR: got bad value {}'.format(value), flush=True)
+        for value in _parse_sdi12_values(response):
+            if not -5.0 < value < 120.0:
+                _log('ERROR: out of range value \"{}\"'.format(value))
                 error = True
                 continue
-            except AssertionError:
-                print('ERROR: out of range value \"{}\"'.format(moisture_value), flush=True)
-                error = True
-                continue
-            moisture_values.append(moisture_value)
-    try:
-        assert len(moisture_values) == num_sensors
-    except AssertionError:
-        print('ERROR: failed to read {} moisture sensors'.format(
-            num_sensors - len(moisture_values)))
+            if count < num_sensors:
+                values[count] = value
+                count += 1
+        if count >= num_sensors:
+            # probes pack several values into each D reply; skip the
+            # remaining round-trips once everything has arrived
+            break
+    if count != num_sensors:
+        _log('ERROR: failed to read {} sensors'.format(num_sensors - count))
         error = True
+        del values[count:]
+    _flush_log()
+    return values, error
 
-    print('starting temperature measurement...')
-    command = '0M1!\r\n'.encode()
-    print('\t{} --> {}'.format(elapsed(start_time), command))
+
+def _poll_probe(port, start_time):
+    # identify the probe, then run both measurement types; returns
+    # (moisture_values, temperature_values, error)
+    print('finding probe...')
+    command = _ID_CMD
+    _log('\t{} --> {}'.format(elapsed(start_time), command))
     port.write(command)
-    response = port.readline()
-    print('\t{} <-- {}'.format(elapsed(start_time), response))
-    response = response.decode().rstrip()
-    delay = int(response[0:3])  # should be 0, and no attention response when ready
-    num_sensors = int(response[-1])
-    print('reading temperature data...')
-    temperature_values = list()
-    error = False
-    for r in range(num_sensors):
-        command = '0D{}!\r\n'.format(r).encode()
-        print('\t{} --> {}'.format(elapsed(start_time), command))
-        port.write(command)
-        response = port.readline()
-        print('\t{} <-- {}'.format(elapsed(start_time), response))
-        response = response.decode().rstrip()
-        if not response:
-            break
-        values = re.findall('[\+\-][0-9]+\.[0-9]+', response)
-        for value in values:
-            if not value:
-                continue
-            try:
-                temperature_value = float(value)
-                assert -5 < temperature_value < 120
-            except ValueError:
-                if not value.isprintable():
-                    value = value.encode()
-                print('ERROR: got bad value {}'.format(value), flush=True)
-                error = True
-                continue
-            except AssertionError:
-                print('ERROR: out of range value \"{}\"'.format(temperature_value), flush=True)
-                error = True
-                continue
-            temperature_values.append(temperature_value)
+    response = port.read_until(b'\r\n', 80)
+    _log('\t{} <-- {}'.format(elapsed(start_time), response))
+    response = response.rstrip()
     try:
-        assert len(temperature_values) == num_sensors
-    except AssertionError:
-        print('ERROR: failed to read {} temperature sensors'.format(num_sensors - len(temperature_values)))
-        error = True
+        _, probe_model_info = response.split(b'AquaChck', 1)
+    except:
+        _flush_log()
+        if response:
+            sys.exit('ERROR: Invalid response from probe: {!r}'.format(response))
+        sys.exit('ERROR: No response from probe')
+    # stay on bytes through the parse; decode only the short banner
+    # fields that are actually displayed
+    probe_model = probe_model_info[:6].decode()
+    probe_version = probe_model_info[6:9].decode()
+    probe_serial_number = probe_model_info[9:].decode()
+    _log('Aquacheck {} S/N {} ver. {}'.format(
+        probe_model, probe_serial_number, probe_version))
+    _flush_log()
+
+    print('starting moisture measurement...')
+    moisture_values, moisture_error = _measure(port, _M0_CMD, start_time)
+    if moisture_error and not moisture_values:
+        # a probe that produced nothing at all won't answer the
+        # temperature commands either; don't double the wasted time
+        print('skipping temperature measurement...')
+        return moisture_values, [], True
+
+    print('starting temperature measurement...')
+    temperature_values, temp_error = _measure(port, _M1_CMD, start_time)
+
+    return moisture_values, temperature_values, moisture_error or temp_error
+
 
-if error:
-    print('ERROR: failed to read all values, please retry.')
-print('SOIL MOISTURE: ', moisture_values)
-print('TEMPERATURE:   ', temperature_values)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Poll an AquaCheck probe over SDI-12.')
+    parser.add_argument(
+        '--loop',
+        type=int,
+        default=1,
+        help='number of polls to run (default: 1)')
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=0.0,
+        help='seconds to wait between polls (default: 0)')
+    args = parser.parse_args()
+    print('opening port...')
+    # open the port once for the whole run; reopening a USB adapter per
+    # poll costs a TTY reset and DTR toggle every time
+    with serial.Serial(**params) as port:
+        try:
+            # cut USB adapter buffering latency on the many short
+            # round-trips; best effort, not every port supports it
+            port.set_low_latency_mode(True)
+        except (AttributeError, NotImplementedError, ValueError):
+            pass
+        for poll in range(args.loop):
+            start_time = _monotonic()
+            moisture_values, temperature_values, error = _poll_probe(
+                port, start_time)
+            if error:
+                print('ERROR: failed to read all values, please retry.')
+            print('SOIL MOISTURE: ', moisture_values)
+            print('TEMPERATURE:   ', temperature_values)
+            if poll + 1 < args.loop:
+                sleep(args.interval)
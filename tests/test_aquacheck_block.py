@@ -23,34 +23,26 @@ class TestAquacheck(NIOBlockTestCase):
             mock_port_2,
         ]
         # 6 sensor probe, with variable number format
-        mock_port_1.readline.side_effect = [
+        mock_port_1.read_until.side_effect = [
             '013AquaChckACHSDI043S012345\r\n'.encode('utf-8'),  # id command
             '0036\r\n'.encode('utf-8'),  # moisture read command
-            ''.encode('utf-8'),  # waiting
-            ''.encode('utf-8'),  # waiting
             '\r\n'.encode('utf-8'),  # attention response
             '+112.12345-4.689'.encode('utf-8'),  # 2 moisture values
             '+32.0000+44.000+99.00+100.2'.encode('utf-8'),  # 4 values
-            '\r\n'.encode('utf-8'),  # no more values
             '0006\r\n'.encode('utf-8'),  # temperature read command
             '+22.1234'.encode('utf-8'),  # 1 temp value
             '-2.689+22.0000+24.000+29.00+20.2'.encode('utf-8'),  # 5 values
-            '\r\n'.encode('utf-8'),  # no more values
         ]
         # 4 sensor probe
-        mock_port_2.readline.side_effect = [
+        mock_port_2.read_until.side_effect = [
             '013AquaChckACHSDI043S543210\r\n'.encode('utf-8'),
             '0054\r\n'.encode('utf-8'),
-            ''.encode('utf-8'),
-            ''.encode('utf-8'),
             '\r\n'.encode('utf-8'),
             '-1.234+2.345+3.456'.encode('utf-8'),
             '+4.567,'.encode('utf-8'),
-            '\r\n'.encode('utf-8'),
             '0004\r\n'.encode('utf-8'),
             '+9.876+8.765+7.654'.encode('utf-8'),
             '+6.543'.encode('utf-8'),
-            '\r\n'.encode('utf-8'),
         ]
 
         block = Aquacheck()